@@ -1,9 +1,96 @@
 import json
 import re
 import os
-import argparse
+import fnmatch
+import mmap
+from collections import Counter
 from typing import List, Dict, Any, Union
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+# Patterns for extracting the room ID and username from Matrix identifiers that
+# don't have the plain '!room:server' / '@user:server' shape (applied after the
+# quotes have been removed)
+_CHAT_ID_RE = re.compile(r'!([\w\d]+)')
+_SENDER_RE = re.compile(r'@?([\w\d_-]+)')
+
+
+def _load_json(input_file: str) -> Any:
+    """Load a JSON file, using orjson when it is available."""
+    if orjson is not None:
+        with open(input_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return orjson.loads(f.read())  # mmap can't map an empty file
+            # Parse straight from the mapped file instead of copying it into a bytes object first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dump_json(data: List[Any], output_file: str):
+    """
+    Write a list as JSON indented by 2 spaces, using orjson when it is available.
+    Items are serialized and written one at a time, so the whole document
+    is never held in memory as a single string. Both paths write the same
+    layout (orjson only supports a 2-space indent).
+    """
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(b'[')
+            separator = b'\n  '
+            for item in data:
+                f.write(separator)
+                f.write(orjson.dumps(item, option=orjson.OPT_INDENT_2).replace(b'\n', b'\n  '))
+                separator = b',\n  '
+            f.write(b'\n]' if data else b']')
+    else:
+        # json.dump already encodes and writes the document incrementally
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def _clean_chat_id(chat_id: str) -> str:
+    """Reduce a Matrix room ID such as '!"room":server' to '!room'."""
+    # Already clean (e.g. the file went through the cleaner before)
+    if chat_id[:1] == '!' and chat_id[1:].isalnum():
+        return chat_id
+    # Fast path: cut at the server part and drop the quotes
+    room = chat_id.partition(':')[0].replace('"', '')
+    if room[:1] == '!' and room[1:].isalnum():
+        return room
+    # Remove quotes, then extract the room ID part (before the server)
+    chat_id = chat_id.replace('"', '')
+    match = _CHAT_ID_RE.search(chat_id)
+    if match:
+        return f"!{match.group(1)}"
+    # Keep original (without quotes) if no match
+    return chat_id
+
+
+def _clean_sender_alias(sender: str) -> str:
+    """Reduce a Matrix user ID such as '@"user":server' to 'user'."""
+    # Already clean (e.g. the file went through the cleaner before)
+    if sender.isalnum():
+        return sender
+    # Fast path: cut at the server part, drop the quotes and the @
+    user = sender.partition(':')[0].replace('"', '')
+    if user[:1] == '@':
+        user = user[1:]
+    if user.isalnum():
+        return user
+    # Remove quotes, then extract the username part (after @ and before :)
+    sender = sender.replace('"', '')
+    match = _SENDER_RE.search(sender)
+    if match:
+        return match.group(1)
+    # Keep original (without quotes) if no match
+    return sender
+
+
 def clean_matrix_json(input_file: str, output_file: str = None) -> List[Dict[str, Any]]:
     """
     Clean a Matrix chat JSON file by:
@@ -20,8 +107,7 @@ def clean_matrix_json(input_file: str, output_file: str = None) -> List[Dict[str
     """
     try:
         # Read the input file
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _load_json(input_file)
         
         # Ensure the data is a list
         if not isinstance(data, list):
@@ -31,46 +117,32 @@ def clean_matrix_json(input_file: str, output_file: str = None) -> List[Dict[str
             else:
                 raise ValueError("Input data is not a list or dictionary")
         
-        # Clean each message
-        cleaned_data = []
+        # Clean each message in place (the parsed data is not used elsewhere).
+        # A log only has a handful of distinct rooms and users, so each distinct
+        # identifier is cleaned once and the result is reused for every message.
+        cleaned_chat_ids = {}
+        cleaned_senders = {}
         for msg in data:
-            cleaned_msg = msg.copy()  # Create a copy to avoid modifying the original
-            
-            # Clean chat_id
             if 'chat_id' in msg:
                 chat_id = msg['chat_id']
-                # Remove quotes
-                chat_id = chat_id.replace('"', '')
-                # Extract the room ID part (before the server)
-                match = re.search(r'!([\w\d]+)', chat_id)
-                if match:
-                    cleaned_msg['chat_id'] = f"!{match.group(1)}"
-                else:
-                    # Keep original if no match
-                    cleaned_msg['chat_id'] = chat_id
+                cleaned = cleaned_chat_ids.get(chat_id)
+                if cleaned is None:
+                    cleaned = cleaned_chat_ids[chat_id] = _clean_chat_id(chat_id)
+                msg['chat_id'] = cleaned
             
-            # Clean sender_alias
             if 'sender_alias' in msg:
                 sender = msg['sender_alias']
-                # Remove quotes
-                sender = sender.replace('"', '')
-                # Extract the username part (after @ and before :)
-                match = re.search(r'@?([\w\d_-]+)', sender)
-                if match:
-                    cleaned_msg['sender_alias'] = match.group(1)
-                else:
-                    # Keep original if no match
-                    cleaned_msg['sender_alias'] = sender
-            
-            cleaned_data.append(cleaned_msg)
+                cleaned = cleaned_senders.get(sender)
+                if cleaned is None:
+                    cleaned = cleaned_senders[sender] = _clean_sender_alias(sender)
+                msg['sender_alias'] = cleaned
         
         # Save to output file if specified
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(cleaned_data, f, indent=4, ensure_ascii=False)
-                print(f"Cleaned data saved to {output_file}")
+            _dump_json(data, output_file)
+            print(f"Cleaned data saved to {output_file}")
         
-        return cleaned_data
+        return data
     
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON: {e}")
@@ -80,7 +152,15 @@ def clean_matrix_json(input_file: str, output_file: str = None) -> List[Dict[str
         return []
 
 
-def batch_clean_matrix_json(input_dir: str, output_dir: str, file_pattern: str = "*.json"):
+def _clean_file(file_path: str, output_path: str) -> int:
+    """
+    Clean a single file for batch mode and return the number of messages
+    (keeps the cleaned messages themselves out of the worker's return value)
+    """
+    return len(clean_matrix_json(file_path, output_path))
+
+
+def batch_clean_matrix_json(input_dir: str, output_dir: str, file_pattern: str = "*.json", max_workers: int = None):
     """
     Process multiple JSON files in a directory
     
@@ -88,14 +168,30 @@ def batch_clean_matrix_json(input_dir: str, output_dir: str, file_pattern: str =
         input_dir: Directory containing input JSON files
         output_dir: Directory to save cleaned JSON files
         file_pattern: Pattern to match JSON files
+        max_workers: Number of worker processes (defaults to the number of CPUs)
     """
-    import glob
+    from concurrent.futures import ProcessPoolExecutor, as_completed
     
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Find all matching files
-    file_paths = glob.glob(os.path.join(input_dir, file_pattern))
+    # Find all matching files. A plain name pattern is matched with a single
+    # directory scan (like glob, the match follows the OS case rules and skips
+    # hidden files unless asked for); a pattern with a directory part is left to glob.
+    file_paths = []
+    if any(sep and sep in file_pattern for sep in (os.sep, os.altsep)):
+        import glob
+        file_paths = [path for path in glob.glob(os.path.join(input_dir, file_pattern)) if os.path.isfile(path)]
+    elif os.path.isdir(input_dir):
+        pattern_re = re.compile(fnmatch.translate(os.path.normcase(file_pattern)))
+        include_hidden = file_pattern.startswith('.')
+        with os.scandir(input_dir) as entries:
+            file_paths = [
+                entry.path for entry in entries
+                if (include_hidden or not entry.name.startswith('.'))
+                and pattern_re.match(os.path.normcase(entry.name))
+                and entry.is_file()
+            ]
     
     if not file_paths:
         print(f"No files matching '{file_pattern}' found in {input_dir}")
@@ -103,13 +199,18 @@ def batch_clean_matrix_json(input_dir: str, output_dir: str, file_pattern: str =
     
     print(f"Found {len(file_paths)} files to process")
     
-    for file_path in file_paths:
-        file_name = os.path.basename(file_path)
-        output_path = os.path.join(output_dir, f"cleaned_{file_name}")
+    # Files are independent of each other, so clean them in worker processes
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for file_path in file_paths:
+            file_name = os.path.basename(file_path)
+            output_path = os.path.join(output_dir, f"cleaned_{file_name}")
+            
+            print(f"Processing {file_name}...")
+            futures[executor.submit(_clean_file, file_path, output_path)] = file_name
         
-        print(f"Processing {file_name}...")
-        messages = clean_matrix_json(file_path, output_path)
-        print(f"Processed {len(messages)} messages")
+        for future in as_completed(futures):
+            print(f"Processed {future.result()} messages from {futures[future]}")
 
 
 def print_summary(messages: List[Dict[str, Any]]):
@@ -123,41 +224,42 @@ def print_summary(messages: List[Dict[str, Any]]):
         print("No messages to summarize")
         return
     
-    # Count unique chat rooms
-    chat_rooms = set()
-    users = set()
+    # Count messages per chat room and per user in a single pass
+    room_counts = Counter()
+    user_counts = Counter()
     
     for msg in messages:
         if 'chat_id' in msg:
-            chat_rooms.add(msg['chat_id'])
+            room_counts[msg['chat_id']] += 1
         if 'sender_alias' in msg:
-            users.add(msg['sender_alias'])
+            user_counts[msg['sender_alias']] += 1
     
     print("\nSummary:")
     print(f"Total messages: {len(messages)}")
-    print(f"Unique chat rooms: {len(chat_rooms)}")
-    print(f"Unique users: {len(users)}")
+    print(f"Unique chat rooms: {len(room_counts)}")
+    print(f"Unique users: {len(user_counts)}")
     
-    if chat_rooms:
+    if room_counts:
         print("\nChat rooms:")
-        for room in sorted(chat_rooms):
-            room_messages = [msg for msg in messages if msg.get('chat_id') == room]
-            print(f"  {room}: {len(room_messages)} messages")
+        for room, count in sorted(room_counts.items()):
+            print(f"  {room}: {count} messages")
     
-    if users:
+    if user_counts:
         print("\nUsers:")
-        for user in sorted(users):
-            user_messages = [msg for msg in messages if msg.get('sender_alias') == user]
-            print(f"  {user}: {len(user_messages)} messages")
+        for user, count in sorted(user_counts.items()):
+            print(f"  {user}: {count} messages")
 
 
 if __name__ == "__main__":
+    import argparse
+    
     parser = argparse.ArgumentParser(description='Clean Matrix chat JSON files')
     parser.add_argument('input', help='Input JSON file or directory')
     parser.add_argument('--output', '-o', help='Output JSON file or directory (default: cleaned_[input])')
     parser.add_argument('--batch', '-b', action='store_true', help='Process all JSON files in the input directory')
     parser.add_argument('--pattern', '-p', default="*.json", help='File pattern for batch mode (default: *.json)')
     parser.add_argument('--summary', '-s', action='store_true', help='Print summary of cleaned messages')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Number of worker processes for batch mode (default: number of CPUs)')
     
     args = parser.parse_args()
     
@@ -165,7 +267,7 @@ if __name__ == "__main__":
         # Batch mode
         input_dir = args.input
         output_dir = args.output or "cleaned_" + os.path.basename(input_dir.rstrip('/\\'))
-        batch_clean_matrix_json(input_dir, output_dir, args.pattern)
+        batch_clean_matrix_json(input_dir, output_dir, args.pattern, args.workers)
     else:
         # Single file mode
         input_file = args.input
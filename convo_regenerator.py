@@ -1,6 +1,78 @@
+import html
 import json
+import os
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
 from typing import Dict, List, Union, Any, Tuple
 
+import dateutil.parser
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+def _load_json(input_file: str) -> Any:
+    """Load a JSON file, using orjson when it is available."""
+    if orjson is not None:
+        with open(input_file, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _script_json(value: Any) -> str:
+    """
+    Serialize a value as JSON that is safe inside an inline <script> block
+    (<, > and & are escaped, so a value can't close the script or open markup).
+    """
+    return json.dumps(value).replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+
+# JavaScript that collects one dropdown category of a turn into the CSV row
+# (filled in per config with str.format, hence the doubled braces)
+_CSV_CATEGORY_JS = """
+            // Process category {cat_id}: {name}
+            (function() {{
+                var cat = {cat_id};
+                var isDependent = {is_dep};
+                var catGroups = turnDiv.getElementsByClassName('cat-' + cat);
+                var primaryVals = [];
+                var detailedVals = [];
+                
+                Array.prototype.forEach.call(catGroups, function(group) {{
+                    var primary = group.querySelector('select[data-dd="' + cat + '"]');
+                    if (primary && primary.value.trim() !== "") {{
+                        primaryVals.push(primary.value.trim());
+                        
+                        if (isDependent) {{
+                            var detail = "";
+                            var depSel = group.querySelector('.dropdown-group[data-dd="dep"] select');
+                            var otherInp = group.querySelector('.dropdown-group[data-dd="other"] input');
+                            
+                            if (otherInp && getComputedStyle(otherInp.parentElement).display !== "none" && otherInp.value.trim() !== "") {{
+                                detail = otherInp.value.trim();
+                            }} else if (depSel && getComputedStyle(depSel.parentElement).display !== "none" && depSel.value.trim() !== "") {{
+                                detail = depSel.value.trim();
+                            }}
+                            
+                            if (detail !== "") {{
+                                detailedVals.push(detail);
+                            }}
+                        }}
+                    }}
+                }});
+                
+                row.push(primaryVals.join(";"));
+                if (isDependent) {{
+                    row.push(detailedVals.join(";"));
+                }}
+            }})();
+"""
+
+
 def conversation_to_html_generalized(
     conversation_turns: Dict, 
     user_i: str, 
@@ -31,37 +103,47 @@ def conversation_to_html_generalized(
             config['button_text'] = f"Add {config['label']}"
         if 'csv_column' not in config:
             config['csv_column'] = config['label']
+    
+    # Whether each config is a dependent dropdown (dict of options), checked once
+    is_dependent_flags = [isinstance(config['options'], dict) for config in dropdown_configs]
             
-    # Retrieve conversation from conversation_turns.
-    if (user_i, user_j) in conversation_turns:
-        units = conversation_turns[(user_i, user_j)]
-    elif (user_j, user_i) in conversation_turns:
-        units = conversation_turns[(user_j, user_i)]
-    else:
+    # Retrieve conversation from conversation_turns. Keys built by
+    # all_conversations_sorted_with_turns_and_html are in sorted order, so try that first.
+    key = (user_i, user_j) if user_i <= user_j else (user_j, user_i)
+    units = conversation_turns.get(key)
+    if units is None:
+        units = conversation_turns.get((key[1], key[0]))
+    if units is None:
         print(f"No conversation found between {user_i} and {user_j}.")
         return
 
     def generate_options(options):
-        opts = '<option value="">--None--</option>\n'
-        for opt in options:
-            opts += f'<option value="{opt}">{opt}</option>\n'
-        return opts
+        return '<option value="">--None--</option>\n' + ''.join(
+            [f'<option value="{opt}">{opt}</option>\n' for opt in options]
+        )
 
     csv_filename = f"conversation_{user_i}_{user_j}_coded.csv"
     
     # Prepare CSV header
     csv_header = ["Unit", "Turn"]
-    for config in dropdown_configs:
+    for config, is_dependent in zip(dropdown_configs, is_dependent_flags):
         csv_header.append(config['csv_column'])
-        if isinstance(config['options'], dict):
+        if is_dependent:
             csv_header.append(f"{config['csv_column']}_Detailed")
     
-    # Begin HTML content
-    html = f"""<!DOCTYPE html>
+    # The user names go into the page as text and into the script as JS strings
+    user_i_html = html.escape(str(user_i), quote=False)
+    user_j_html = html.escape(str(user_j), quote=False)
+
+    # Write the HTML straight to the output file as it is generated
+    # (newline="" keeps the same line endings on every platform)
+    with open(html_file, "w", encoding="utf-8", newline="") as f:
+        write = f.write
+        write(f"""<!DOCTYPE html>
 <html>
 <head>
 <meta charset="utf-8">
-<title>Conversation: {user_i} and {user_j}</title>
+<title>Conversation: {user_i_html} and {user_j_html}</title>
 <style>
     body {{
         font-family: Arial, sans-serif;
@@ -134,29 +216,29 @@ def conversation_to_html_generalized(
 </style>
 </head>
 <body>
-<h2>Conversation: {user_i} & {user_j}</h2>
+<h2>Conversation: {user_i_html} &amp; {user_j_html}</h2>
 <div class="clearfix" id="content">
-"""
+""")
 
-    # JavaScript for dependent dropdowns
-    html += f"""
+        # Mappings for dependent dropdowns keyed by category id, serialized in one go
+        dependent_mappings = {
+            str(i + 1): config['options']
+            for i, config in enumerate(dropdown_configs)
+            if is_dependent_flags[i]
+        }
+
+        # JavaScript for dependent dropdowns
+        write(f"""
 <script>
 // User variables
-var user_i = "{user_i}";
-var user_j = "{user_j}";
+var user_i = {_script_json(user_i)};
+var user_j = {_script_json(user_j)};
 
 // Mappings for dependent dropdowns
-var dependentMappings = {{
-"""
-
-    # Add JavaScript mappings for dependent dropdowns
-    for i, config in enumerate(dropdown_configs):
-        if isinstance(config['options'], dict):
-            html += f"    '{i+1}': {json.dumps(config['options'])},\n"
-    
-    html += """
-};
-
+var dependentMappings = {json.dumps(dependent_mappings)};
+""")
+        
+        write("""
 // Wait for the DOM to be fully loaded
 document.addEventListener('DOMContentLoaded', function() {
     // --- Primary Dropdown Change Event for Dependent Dropdowns ---
@@ -182,12 +264,12 @@ document.addEventListener('DOMContentLoaded', function() {
                         if (otherGroup) otherGroup.style.display = "none";
                         if (depSelect) {
                             depSelect.innerHTML = '<option value="">--Select--</option>';
+                            // Build the options off-document and insert them in one go
+                            var fragment = document.createDocumentFragment();
                             dependentMappings[catId][selected].forEach(function(opt) {
-                                var option = document.createElement("option");
-                                option.value = opt;
-                                option.text = opt;
-                                depSelect.appendChild(option);
+                                fragment.appendChild(new Option(opt, opt));
                             });
+                            depSelect.appendChild(fragment);
                             depGroup.style.display = "inline-block";
                         }
                     } else {
@@ -235,13 +317,13 @@ document.addEventListener('DOMContentLoaded', function() {
     // --- CSV Download Functionality ---
     document.getElementById("downloadCSVButton").addEventListener("click", function() {
         var csvRows = [];
-        var headers = ["""
+        var headers = [""")
 
-    # Add CSV headers
-    header_str = ", ".join([f'"{h}"' for h in csv_header])
-    html += header_str
-    
-    html += """];
+        # Add CSV headers
+        header_str = ", ".join([f'"{h}"' for h in csv_header])
+        write(header_str)
+        
+        write("""];
         csvRows.push(headers.join(","));
         
         var turnDivs = document.querySelectorAll(".turn");
@@ -249,149 +331,122 @@ document.addEventListener('DOMContentLoaded', function() {
             var unit = turnDiv.getAttribute("data-unit") || "";
             var turn = turnDiv.getAttribute("data-turn") || "";
             var row = [unit, turn];
-"""
+""")
 
-    # Generate JavaScript for processing each dropdown category
-    for i, config in enumerate(dropdown_configs):
-        cat_id = i + 1
-        is_dependent = isinstance(config['options'], dict)
-        html += f"""
-            // Process category {cat_id}: {config['name']}
-            (function() {{
-                var cat = {cat_id};
-                var isDependent = {str(is_dependent).lower()};
-                var catGroups = turnDiv.querySelectorAll('[data-cat="' + cat + '"]');
-                var primaryVals = [];
-                var detailedVals = [];
-                
-                catGroups.forEach(function(group) {{
-                    var primary = group.querySelector('select[data-dd="' + cat + '"]');
-                    if (primary && primary.value.trim() !== "") {{
-                        primaryVals.push(primary.value.trim());
-                        
-                        if (isDependent) {{
-                            var detail = "";
-                            var depSel = group.querySelector('.dropdown-group[data-dd="dep"] select');
-                            var otherInp = group.querySelector('.dropdown-group[data-dd="other"] input');
-                            
-                            if (otherInp && getComputedStyle(otherInp.parentElement).display !== "none" && otherInp.value.trim() !== "") {{
-                                detail = otherInp.value.trim();
-                            }} else if (depSel && getComputedStyle(depSel.parentElement).display !== "none" && depSel.value.trim() !== "") {{
-                                detail = depSel.value.trim();
-                            }}
-                            
-                            if (detail !== "") {{
-                                detailedVals.push(detail);
-                            }}
-                        }}
-                    }}
-                }});
-                
-                row.push(primaryVals.join(";"));
-                if (isDependent) {{
-                    row.push(detailedVals.join(";"));
-                }}
-            }})();
-"""
-    
-    html += """
+        # Generate JavaScript for processing each dropdown category
+        write("".join([
+            _CSV_CATEGORY_JS.format(cat_id=i + 1, name=config['name'], is_dep=str(is_dependent).lower())
+            for i, (config, is_dependent) in enumerate(zip(dropdown_configs, is_dependent_flags))
+        ]))
+        
+        write("""
             csvRows.push(row.join(","));
         });
         
-        var csvContent = "data:text/csv;charset=utf-8," + csvRows.join("\\n");
-        var encodedUri = encodeURI(csvContent);
+        // Hand the CSV to the browser as a Blob (no URI-encoding pass, no data-URI size limit)
+        var blob = new Blob([csvRows.join("\\n")], {type: "text/csv;charset=utf-8"});
+        var url = URL.createObjectURL(blob);
         var link = document.createElement("a");
-        link.setAttribute("href", encodedUri);
-        link.setAttribute("download", "conversation_"""
+        link.setAttribute("href", url);
+        link.setAttribute("download", """)
 
-    html += f"{user_i}_{user_j}_coded.csv"
-    
-    html += """");
+        write(_script_json(f"conversation_{user_i}_{user_j}_coded.csv"))
+        
+        write(""");
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
+        // Revoke only after the browser has had a chance to start reading the blob
+        setTimeout(function() { URL.revokeObjectURL(url); }, 1000);
     });
 });
 </script>
-"""
+""")
+
+        # Controls shown under a dependent dropdown: the detailed dropdown and an input for "Other"
+        dependent_controls = (
+            '<div class="dropdown-group" data-dd="dep" style="display:none;">\n'
+            '<label>Detailed: </label>\n'
+            '<select class="dependent-dropdown" data-dd="dep">\n'
+            '<option value="">--Select--</option>\n'
+            '</select>\n'
+            '</div>\n'
+            '<div class="dropdown-group" data-dd="other" style="display:none;">\n'
+            '<label>Please specify: </label>\n'
+            '<input type="text" class="other-input" data-dd="other" />\n'
+            '</div>\n'
+        )
 
-    # Build conversation turns with the dropdowns
-    cumulative_turn = 1
-    for unit_idx, unit in enumerate(units):
-        for turn_idx, turn in enumerate(unit):
-            if not turn:
-                continue
-            turn_sender = turn[0][1]
-            alignment = "right" if turn_sender == user_i else "left"
-            html += f'<div class="turn {alignment}" data-unit="{unit_idx}" data-turn="{turn_idx}">\n'
-            html += f'<strong>Turn {cumulative_turn} ({turn_sender}):</strong><br>\n'
-            for msg in turn:
-                timestamp = msg[0]
-                message_text = msg[3]
-                html += f'<div class="message"><span class="timestamp">{timestamp}</span> - <span class="text">{message_text}</span></div>\n'
-            html += '<div class="dropdown-container">\n'
-            
-            # Generate dropdowns based on configurations
-            for i, config in enumerate(dropdown_configs):
-                cat_id = i + 1
-                is_dependent = isinstance(config['options'], dict)
-                container_class = "category-group" if is_dependent else "dropdown-group-container"
-                
-                html += f'<div class="{container_class}" data-cat="{cat_id}" data-unit="{unit_idx}" data-turn="{turn_idx}">\n'
-                
+        # The dropdowns only differ between turns in data-unit/data-turn, so render
+        # them once as a format template (literal braces doubled) and fill those in per turn
+        dropdown_blocks = []
+        for i, config in enumerate(dropdown_configs):
+            cat_id = i + 1
+            is_dependent = is_dependent_flags[i]
+            container_class = "category-group" if is_dependent else "dropdown-group-container"
+            if is_dependent:
+                # For dependent dropdown, options are the keys of the dictionary
+                options_list = list(config['options'].keys())
+                options_list.append("Other")  # Add "Other" option
+            else:
+                # For simple dropdown, options are directly from the list
+                options_list = config['options']
+            static_html = (
                 # Primary dropdown
-                html += f'<div class="dropdown-group" data-dd="{cat_id}">\n'
-                html += f'<label>{config["label"]}: </label>\n'
-                html += f'<select class="turn-dropdown" data-dd="{cat_id}">\n'
-                
-                if is_dependent:
-                    # For dependent dropdown, options are the keys of the dictionary
-                    options_list = list(config['options'].keys())
-                    options_list.append("Other")  # Add "Other" option
-                    html += generate_options(options_list)
-                else:
-                    # For simple dropdown, options are directly from the list
-                    html += generate_options(config['options'])
-                
-                html += '</select>\n'
-                html += '</div>\n'
-                
-                # If dependent dropdown, add the dependent controls
-                if is_dependent:
-                    # Dependent dropdown
-                    html += f'<div class="dropdown-group" data-dd="dep" style="display:none;">\n'
-                    html += f'<label>Detailed: </label>\n'
-                    html += f'<select class="dependent-dropdown" data-dd="dep">\n'
-                    html += '<option value="">--Select--</option>\n'
-                    html += '</select>\n'
-                    html += '</div>\n'
-                    
-                    # Input field for "Other"
-                    html += f'<div class="dropdown-group" data-dd="other" style="display:none;">\n'
-                    html += f'<label>Please specify: </label>\n'
-                    html += f'<input type="text" class="other-input" data-dd="other" />\n'
-                    html += '</div>\n'
+                f'<div class="dropdown-group" data-dd="{cat_id}">\n'
+                f'<label>{config["label"]}: </label>\n'
+                f'<select class="turn-dropdown" data-dd="{cat_id}">\n'
+                f'{generate_options(options_list)}'
+                '</select>\n'
+                '</div>\n'
+                f'{dependent_controls if is_dependent else ""}'
+                f'<button type="button" class="add-button" data-cat="{cat_id}">{config["button_text"]}</button>\n'
+                '</div>\n'
+            )
+            dropdown_blocks.append(
+                f'<div class="{container_class} cat-{cat_id}" data-cat="{cat_id}" data-unit="{{unit_idx}}" data-turn="{{turn_idx}}">\n'
+                + static_html.replace('{', '{{').replace('}', '}}')
+            )
+        dropdowns_template = ''.join(dropdown_blocks)
+        escape = html.escape
+
+        # Build conversation turns with the dropdowns
+        cumulative_turn = 1
+        for unit_idx, unit in enumerate(units):
+            for turn_idx, turn in enumerate(unit):
+                if not turn:
+                    continue
+                turn_sender = turn[0][1]
+                alignment = "right" if turn_sender == user_i else "left"
+                # Message text is escaped so markup in a message can't break (or inject into) the page
+                messages_html = ''.join([
+                    f'<div class="message"><span class="timestamp">{msg[0]}</span> - <span class="text">{escape(str(msg[3]), quote=False)}</span></div>\n'
+                    for msg in turn
+                ])
+                dropdowns_html = dropdowns_template.format(unit_idx=unit_idx, turn_idx=turn_idx)
                 
-                html += f'<button type="button" class="add-button" data-cat="{cat_id}">{config["button_text"]}</button>\n'
-                html += '</div>\n'
-            
-            html += '</div>\n'  # End of dropdown-container
-            html += '</div>\n'  # End of turn div
-            cumulative_turn += 1
-
-    html += '<div class="clear"></div>\n'
-    # Download CSV button
-    html += '<button class="download-button" id="downloadCSVButton">Download</button>\n'
-    
-    # Close tags
-    html += """
+                write(
+                    f'<div class="turn {alignment}" data-unit="{unit_idx}" data-turn="{turn_idx}">\n'
+                    f'<strong>Turn {cumulative_turn} ({escape(str(turn_sender))}):</strong><br>\n'
+                    f'{messages_html}'
+                    '<div class="dropdown-container">\n'
+                    f'{dropdowns_html}'
+                    '</div>\n'  # End of dropdown-container
+                    '</div>\n'  # End of turn div
+                )
+                cumulative_turn += 1
+
+        write('<div class="clear"></div>\n')
+        # Download CSV button
+        write('<button class="download-button" id="downloadCSVButton">Download</button>\n')
+        
+        # Close tags
+        write("""
 </div>
 </body>
 </html>
-"""
+""")
     
-    with open(html_file, "w", encoding="utf-8") as f:
-        f.write(html)
     print(f"HTML file '{html_file}' created successfully.")
 
 
@@ -416,19 +471,9 @@ def all_conversations_sorted_with_turns_and_html(
     Returns:
         Dictionary of conversation segments split by date and then into speaking turns
     """
-    # First, process all conversations and get turns
-    import json
-    import dateutil.parser
-    import os
-    import argparse
-    from typing import List, Dict, Any, Tuple
-    from collections import defaultdict
-    from datetime import datetime, timedelta
-    
     # Step 0: Load alias mapping from the provided JSON file
     try:
-        with open(user_match_list, "r") as f:
-            alias_list = json.load(f)
+        alias_list = _load_json(user_match_list)
     except Exception as e:
         print(f"Failed to load alias mapping from {user_match_list}: {e}")
         alias_list = []
@@ -443,18 +488,23 @@ def all_conversations_sorted_with_turns_and_html(
                 alias_mapping[alias] = primary
 
     # Step 1: Count messages in JSON log files
-    structured_messages = {}  # dict to store conversations
+    structured_messages = {}  # (user, user) pair -> list of messages
     initial_count = 0
+    get_alias = alias_mapping.get  # bound once, used twice per message
     
     # Process each chat log file directly
     for file_path in conti_chats:
         if os.path.exists(file_path):
-            with open(file_path) as f:
-                json_data = json.load(f)
+            json_data = _load_json(file_path)
             
             for item in json_data:
                 if 'ts' in item:
-                    item['ts'] = dateutil.parser.isoparse(item['ts'])  # ISO 8601 extended format
+                    # ISO 8601 extended format; the C parser handles the usual shapes,
+                    # dateutil covers whatever this Python's fromisoformat rejects
+                    try:
+                        item['ts'] = datetime.fromisoformat(item['ts'])
+                    except (AttributeError, ValueError):  # no fromisoformat before Python 3.7
+                        item['ts'] = dateutil.parser.isoparse(item['ts'])
             
             logs = json_data
             initial_count += len(logs)
@@ -465,82 +515,83 @@ def all_conversations_sorted_with_turns_and_html(
                 receiver = i['to']
 
                 # Normalize using alias mapping if the name is an alias
-                sender_canonical = alias_mapping.get(sender, sender)
-                receiver_canonical = alias_mapping.get(receiver, receiver)
+                sender_canonical = get_alias(sender, sender)
+                receiver_canonical = get_alias(receiver, receiver)
 
                 # Use sorted keys for uniqueness (order-independent conversation key)
-                key1, key2 = sorted([sender_canonical, receiver_canonical])
-                if key1 not in structured_messages:
-                    structured_messages[key1] = {}
-                if key2 not in structured_messages[key1]:
-                    structured_messages[key1][key2] = []
-                structured_messages[key1][key2].append((i['ts'], sender_canonical, receiver_canonical, i['body']))
+                if sender_canonical <= receiver_canonical:
+                    key1, key2 = sender_canonical, receiver_canonical
+                else:
+                    key1, key2 = receiver_canonical, sender_canonical
+                # Fetch (or create) the conversation with a single lookup
+                convo = structured_messages.get((key1, key2))
+                if convo is None:
+                    convo = structured_messages[key1, key2] = []
+                convo.append((i['ts'], sender_canonical, receiver_canonical, i['body']))
         else:
             print(f"Warning: File not found: {file_path}")
     
     # Step 2: Count messages in structured_messages
-    processed_count = sum(len(convo) for user in structured_messages.values() for convo in user.values())
+    processed_count = sum(map(len, structured_messages.values()))
     print(f"Total processed message count: {processed_count}")
 
-    # Sorting each conversation by time (assuming timestamp is the first tuple element)
-    for user in structured_messages.keys():
-        for convo in structured_messages[user].keys():
-            structured_messages[user][convo].sort(key=lambda x: x[0])
+    # Sorting each conversation by time (assuming timestamp is the first tuple element),
+    # with a C-level key function instead of a Python lambda per message
+    by_timestamp = itemgetter(0)
+    for messages in structured_messages.values():
+        messages.sort(key=by_timestamp)
 
     if initial_count != processed_count:
         print(f"Mismatch detected! Initial count: {initial_count}, Processed count: {processed_count}")
     
-    # Step 3: Segment conversations by date
-    conversation_segments = {}
-
-    for user_i, threads in structured_messages.items():
-        for user_j, messages in threads.items():
-            # Group messages by date
-            conversation_units = defaultdict(list)
-            for msg in messages:
-                msg_date = msg[0].date()  # Extract the date from the timestamp
-                conversation_units[msg_date].append(msg)
-
-            # Store the segmented conversation
-            conversation_segments[(user_i, user_j)] = list(conversation_units.values())
+    # Steps 3 and 4: Segment conversations by date and split each date into speaking turns.
+    # Messages are sorted, so each date is one contiguous run; the runs are split into
+    # turns as they are produced instead of being copied into per-date lists first.
+    print(f'Total number of conversation histories {len(structured_messages)}')
     
-    print(f'Total number of conversation histories {len(conversation_segments)}')
-    
-    # Step 4: Split into speaking turns
     conversation_turns = {}
+    turn_gap = timedelta(seconds=1800)  # compared directly, no float conversion per message
+
+    def message_date(msg):
+        return msg[0].date()  # Extract the date from the timestamp
+
+    # Return the conversations grouped by their first user, in the order each first user
+    # (and then each partner) was first seen, as before the pair keys were flattened.
+    # The sort is stable, so it only regroups the pairs.
+    first_user_rank = {}
+    for user_i, _ in structured_messages:
+        if user_i not in first_user_rank:
+            first_user_rank[user_i] = len(first_user_rank)
+    ordered_pairs = sorted(structured_messages, key=lambda pair: first_user_rank[pair[0]])
 
     # Iterate over each conversation identified by a pair (user_i, user_j)
-    for (user_i, user_j), units in conversation_segments.items():
+    for pair in ordered_pairs:
+        messages = structured_messages[pair]
         new_units = []  # For storing all turn-split units within this conversation
 
-        for unit in units:
-            if not unit:
-                continue  # Skip empty units if any
-
-            current_turn = [unit[0]]  # Start with the first message in the unit
+        for _, unit in groupby(messages, key=message_date):
+            prev_msg = next(unit)
+            current_turn = [prev_msg]  # Start with the first message in the unit
             turns = []
 
             # Go through each subsequent message in the unit
-            for i in range(1, len(unit)):
-                curr_msg = unit[i]
-                prev_msg = unit[i - 1]
-                
+            for curr_msg in unit:
                 # Check if the sender has changed OR if the time difference is more than 30 minutes.
-                if curr_msg[1] != prev_msg[1] or ((curr_msg[0] - prev_msg[0]).total_seconds() > 1800):
+                if curr_msg[1] != prev_msg[1] or curr_msg[0] - prev_msg[0] > turn_gap:
                     # Save the finished turn and start a new one.
                     turns.append(current_turn)
                     current_turn = [curr_msg]
                 else:
                     # Same sender and less than 30 minutes apart: continue the same turn.
                     current_turn.append(curr_msg)
+                prev_msg = curr_msg
 
             # Append the final current turn for this unit.
-            if current_turn:
-                turns.append(current_turn)
+            turns.append(current_turn)
 
             new_units.append(turns)
 
-        conversation_turns[(user_i, user_j)] = new_units
+        conversation_turns[pair] = new_units
     
     # Step 5: Generate HTML files if requested
     if output_users and dropdown_configs:
@@ -562,7 +613,6 @@ def all_conversations_sorted_with_turns_and_html(
 if __name__ == "__main__":
     import argparse
     import sys
-    import os
     
     # Define a function to create sample dropdown configurations
     def get_sample_configs():
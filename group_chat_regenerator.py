@@ -1,31 +1,178 @@
+import html
 import json
 import os
-import dateutil.parser
-from typing import Dict, List, Any
-from collections import defaultdict
-from datetime import datetime
+import sys
+from typing import Dict, List, Any, Tuple
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
 
-def parse_group_chat(file_path: str) -> List[Dict]:
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+# JavaScript that collects one dropdown category of a turn into the CSV row
+# (filled in per config with str.format, hence the doubled braces)
+_CSV_CATEGORY_JS = """
+            // Process category {cat_id}: {name}
+            (function() {{
+                var cat = {cat_id};
+                var isDependent = {is_dep};
+                var catGroups = turnDiv.getElementsByClassName('cat-' + cat);
+                var primaryVals = [];
+                var detailedVals = [];
+                
+                Array.prototype.forEach.call(catGroups, function(group) {{
+                    var primary = group.querySelector('select[data-dd="' + cat + '"]');
+                    if (primary && primary.value.trim() !== "") {{
+                        primaryVals.push(primary.value.trim());
+                        
+                        if (isDependent) {{
+                            var detail = "";
+                            var depSel = group.querySelector('.dropdown-group[data-dd="dep"] select');
+                            var otherInp = group.querySelector('.dropdown-group[data-dd="other"] input');
+                            
+                            if (otherInp && getComputedStyle(otherInp.parentElement).display !== "none" && otherInp.value.trim() !== "") {{
+                                detail = otherInp.value.trim();
+                            }} else if (depSel && getComputedStyle(depSel.parentElement).display !== "none" && depSel.value.trim() !== "") {{
+                                detail = depSel.value.trim();
+                            }}
+                            
+                            if (detail !== "") {{
+                                detailedVals.push(detail);
+                            }}
+                        }}
+                    }}
+                }});
+                
+                row.push(primaryVals.join(";"));
+                if (isDependent) {{
+                    row.push(detailedVals.join(";"));
+                }}
+            }})();
+"""
+
+
+def _load_json(input_file: str) -> Any:
+    """Load a JSON file, using orjson when it is available."""
+    if orjson is not None:
+        with open(input_file, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=4096)
+def _parse_ts(ts: str) -> datetime:
+    """
+    Parse a message timestamp. The logs use ISO 8601 timestamps, which the C
+    parser handles; dateutil covers anything else. Busy chats repeat the same
+    timestamp string many times, so parsed values are cached.
+    """
+    try:
+        return datetime.fromisoformat(ts)
+    except (AttributeError, ValueError):  # no fromisoformat before Python 3.7
+        # Only needed for non-ISO timestamps (or Pythons without fromisoformat), so dateutil is imported on first use
+        import dateutil.parser
+        return dateutil.parser.parse(ts)
+
+
+def _script_json(value: Any) -> str:
+    """
+    Serialize a value as JSON that is safe inside an inline <script> block
+    (<, > and & are escaped, so a value can't close the script or open markup).
+    """
+    return json.dumps(value).replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+
+def _safe_chat_id(chat_id: str) -> str:
+    """Reduce a chat ID to the characters that are safe in a file name (letters, digits, _ and -)."""
+    return ''.join(c for c in chat_id if c.isalnum() or c in '_-')
+
+
+def _prepare_messages(messages: List[Dict]):
+    """
+    Parse each message's timestamp to a datetime object (in place). A log only has a
+    handful of distinct chats and senders, so those IDs are interned to share one string
+    object each (which also makes the sender comparisons in the turn loop identity checks).
+    """
+    intern = sys.intern
+    for msg in messages:
+        if 'timestamp' in msg and isinstance(msg['timestamp'], str):
+            msg['timestamp'] = _parse_ts(msg['timestamp'])
+        if 'chat_id' in msg and isinstance(msg['chat_id'], str):
+            msg['chat_id'] = intern(msg['chat_id'])
+        if 'sender_alias' in msg and isinstance(msg['sender_alias'], str):
+            msg['sender_alias'] = intern(msg['sender_alias'])
+
+
+def parse_group_chat(file_path: str, chat_id: str = None) -> List[Dict]:
     """
     Parse a file containing clean group chat messages in JSON format.
     
     Args:
         file_path: Path to the group chat JSON file
+        chat_id: If given, only messages of this chat are kept (and have their timestamps parsed)
         
     Returns:
         List of message dictionaries
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        messages = json.load(f)
-    
-    # Ensure timestamps are parsed to datetime objects
-    for msg in messages:
-        if 'timestamp' in msg and isinstance(msg['timestamp'], str):
-            msg['timestamp'] = dateutil.parser.parse(msg['timestamp'])
+    if chat_id is not None:
+        return _parse_chat(file_path, chat_id)[0]
     
+    messages = _load_json(file_path)
+    _prepare_messages(messages)
     return messages
 
 
+def _parse_chat(file_path: str, chat_id: str) -> Tuple[List[Dict], Counter]:
+    """
+    Parse a group chat file keeping only the specified chat, and count its messages
+    per sender in the same pass that drops the other chats.
+    
+    Args:
+        file_path: Path to the group chat JSON file
+        chat_id: The chat ID to filter for
+        
+    Returns:
+        The chat's messages and a Counter of messages per sender
+    """
+    # Drop other chats before doing any per-message work
+    chat_messages, sender_counts = _filter_chat(_load_json(file_path), chat_id)
+    _prepare_messages(chat_messages)
+    return chat_messages, sender_counts
+
+
+def _filter_chat(messages: List[Dict], chat_id: str) -> Tuple[List[Dict], Counter]:
+    """
+    Collect the messages of the specified chat and count them per sender in a single pass.
+    
+    Args:
+        messages: List of message dictionaries
+        chat_id: The chat ID to filter for
+        
+    Returns:
+        The chat's messages (in their original order) and a Counter of messages per sender
+    """
+    chat_messages = []
+    sender_counts = Counter()
+    for msg in messages:
+        if msg.get('chat_id') == chat_id:
+            chat_messages.append(msg)
+            if 'sender_alias' in msg:
+                sender_counts[msg['sender_alias']] += 1
+    return chat_messages, sender_counts
+
+
+def _most_active(sender_counts: Counter) -> str:
+    """Return the sender with the most messages (the first one seen on a tie), or "" if none."""
+    if sender_counts:
+        return sender_counts.most_common(1)[0][0]
+    return ""
+
+
 def find_most_active_user(messages: List[Dict], chat_id: str) -> str:
     """
     Find the user who sent the most messages in the specified chat.
@@ -37,27 +184,8 @@ def find_most_active_user(messages: List[Dict], chat_id: str) -> str:
     Returns:
         Username of the most active sender in the chat
     """
-    # Filter messages for the specified chat
-    chat_messages = [msg for msg in messages if msg.get('chat_id') == chat_id]
-    
-    if not chat_messages:
-        return ""
-    
-    # Count messages per user
-    user_message_counts = {}
-    for msg in chat_messages:
-        if 'sender_alias' in msg:
-            sender = msg['sender_alias']
-            if sender in user_message_counts:
-                user_message_counts[sender] += 1
-            else:
-                user_message_counts[sender] = 1
-    
-    # Find user with most messages
-    if user_message_counts:
-        return max(user_message_counts.items(), key=lambda x: x[1])[0]
-    
-    return ""
+    _, sender_counts = _filter_chat(messages, chat_id)
+    return _most_active(sender_counts)
 
 
 def group_chat_to_html(messages: List[Dict], chat_id: str, main_user: str, html_file: str, dropdown_configs: List[Dict[str, Any]]):
@@ -72,6 +200,30 @@ def group_chat_to_html(messages: List[Dict], chat_id: str, main_user: str, html_
         html_file: Output HTML file path
         dropdown_configs: List of dictionaries defining dropdown configurations
     """
+    # Filter messages for the specified chat_id, counting senders on the way
+    chat_messages, sender_counts = _filter_chat(messages, chat_id)
+    _write_group_chat_html(chat_messages, sender_counts, chat_id, main_user, html_file, dropdown_configs)
+
+
+def _write_group_chat_html(
+    chat_messages: List[Dict],
+    sender_counts: Counter,
+    chat_id: str,
+    main_user: str,
+    html_file: str,
+    dropdown_configs: List[Dict[str, Any]]
+):
+    """
+    Write the HTML file for one chat's messages (see group_chat_to_html).
+    
+    Args:
+        chat_messages: The chat's messages, already filtered by chat_id
+        sender_counts: Counter of messages per sender in chat_messages
+        chat_id: The chat ID the messages belong to
+        main_user: The username for the main user (messages will be shown on the right)
+        html_file: Output HTML file path
+        dropdown_configs: List of dictionaries defining dropdown configurations
+    """
     # Process configuration to add defaults for optional fields
     for config in dropdown_configs:
         if 'button_text' not in config:
@@ -79,38 +231,45 @@ def group_chat_to_html(messages: List[Dict], chat_id: str, main_user: str, html_
         if 'csv_column' not in config:
             config['csv_column'] = config['label']
     
-    # Filter messages for the specified chat_id
-    chat_messages = [msg for msg in messages if msg.get('chat_id') == chat_id]
+    # Whether each config is a dependent dropdown (dict of options), checked once
+    is_dependent_flags = [isinstance(config['options'], dict) for config in dropdown_configs]
     
     if not chat_messages:
         print(f"No messages found for chat_id: {chat_id}")
         return
     
-    # Sort messages by timestamp
-    chat_messages.sort(key=lambda x: x.get('timestamp', datetime.min))
+    # Sort messages by timestamp with a C-level key function; the lambda with a
+    # default is only needed when some message has no timestamp (keys are all
+    # computed before sorting starts, so a failed attempt leaves the list as it was)
+    try:
+        chat_messages.sort(key=itemgetter('timestamp'))
+    except KeyError:
+        chat_messages.sort(key=lambda x: x.get('timestamp', datetime.min))
     
     # Get unique users in the chat
-    users = set(msg.get('sender_alias', '') for msg in chat_messages if 'sender_alias' in msg)
-    print(f"Users in chat: {', '.join(users)}")
+    users = set(sender_counts)
+    print(f"Users in chat: {', '.join(map(str, users))}")
     
     # Group messages by sender and turn
     turns = []
     current_sender = None
     current_turn = []
+    last_timestamp = None  # timestamp of the previous message (the last one in current_turn)
+    turn_gap = timedelta(seconds=1800)  # compared directly, no float conversion per message
     
     for msg in chat_messages:
         sender = msg.get('sender_alias', '')
         timestamp = msg.get('timestamp', datetime.min)
         
         # If sender changes or time gap is more than 30 minutes, start a new turn
-        if (sender != current_sender or 
-            (current_turn and (timestamp - current_turn[-1].get('timestamp', datetime.min)).total_seconds() > 1800)):
+        if sender != current_sender or (current_turn and timestamp - last_timestamp > turn_gap):
             if current_turn:
                 turns.append(current_turn)
             current_turn = [msg]
             current_sender = sender
         else:
             current_turn.append(msg)
+        last_timestamp = timestamp
     
     # Add the last turn
     if current_turn:
@@ -118,24 +277,30 @@ def group_chat_to_html(messages: List[Dict], chat_id: str, main_user: str, html_
     
     # Generate HTML
     def generate_options(options):
-        opts = '<option value="">--None--</option>\n'
-        for opt in options:
-            opts += f'<option value="{opt}">{opt}</option>\n'
-        return opts
+        return '<option value="">--None--</option>\n' + ''.join(
+            [f'<option value="{opt}">{opt}</option>\n' for opt in options]
+        )
 
     # Prepare CSV header
     csv_header = ["Turn", "Sender"]
-    for config in dropdown_configs:
+    for config, is_dependent in zip(dropdown_configs, is_dependent_flags):
         csv_header.append(config['csv_column'])
-        if isinstance(config['options'], dict):
+        if is_dependent:
             csv_header.append(f"{config['csv_column']}_Detailed")
     
-    # Begin HTML content
-    html = f"""<!DOCTYPE html>
+    # The chat ID and main user go into the page as text and into the script as JS strings
+    chat_id_html = html.escape(str(chat_id), quote=False)
+    main_user_html = html.escape(str(main_user), quote=False)
+    
+    # Write the HTML straight to the output file as it is generated
+    # (newline="" keeps the same line endings on every platform)
+    with open(html_file, "w", encoding="utf-8", newline="") as f:
+        write = f.write
+        write(f"""<!DOCTYPE html>
 <html>
 <head>
 <meta charset="utf-8">
-<title>Group Chat: {chat_id}</title>
+<title>Group Chat: {chat_id_html}</title>
 <style>
     body {{
         font-family: Arial, sans-serif;
@@ -213,28 +378,30 @@ def group_chat_to_html(messages: List[Dict], chat_id: str, main_user: str, html_
 </style>
 </head>
 <body>
-<h2>Group Chat: {chat_id}</h2>
-<p>Main user (messages on right): <strong>{main_user}</strong></p>
+<h2>Group Chat: {chat_id_html}</h2>
+<p>Main user (messages on right): <strong>{main_user_html}</strong></p>
 <div class="clearfix" id="content">
-"""
+""")
 
-    # JavaScript for dependent dropdowns
-    html += f"""
+        # JavaScript for dependent dropdowns
+        write(f"""
 <script>
 // Chat variables
-var chat_id = "{chat_id}";
-var main_user = "{main_user}";
+var chat_id = {_script_json(chat_id)};
+var main_user = {_script_json(main_user)};
 
 // Mappings for dependent dropdowns
 var dependentMappings = {{
-"""
+""")
 
-    # Add JavaScript mappings for dependent dropdowns
-    for i, config in enumerate(dropdown_configs):
-        if isinstance(config['options'], dict):
-            html += f"    '{i+1}': {json.dumps(config['options'])},\n"
-    
-    html += """
+        # Add JavaScript mappings for dependent dropdowns, serialized once per config
+        write(''.join([
+            f"    '{i+1}': {json.dumps(config['options'])},\n"
+            for i, config in enumerate(dropdown_configs)
+            if is_dependent_flags[i]
+        ]))
+        
+        write("""
 };
 
 // Wait for the DOM to be fully loaded
@@ -262,12 +429,12 @@ document.addEventListener('DOMContentLoaded', function() {
                         if (otherGroup) otherGroup.style.display = "none";
                         if (depSelect) {
                             depSelect.innerHTML = '<option value="">--Select--</option>';
+                            // Build the options off-document and insert them in one go
+                            var fragment = document.createDocumentFragment();
                             dependentMappings[catId][selected].forEach(function(opt) {
-                                var option = document.createElement("option");
-                                option.value = opt;
-                                option.text = opt;
-                                depSelect.appendChild(option);
+                                fragment.appendChild(new Option(opt, opt));
                             });
+                            depSelect.appendChild(fragment);
                             depGroup.style.display = "inline-block";
                         }
                     } else {
@@ -315,13 +482,13 @@ document.addEventListener('DOMContentLoaded', function() {
     // --- CSV Download Functionality ---
     document.getElementById("downloadCSVButton").addEventListener("click", function() {
         var csvRows = [];
-        var headers = ["""
+        var headers = [""")
 
-    # Add CSV headers
-    header_str = ", ".join([f'"{h}"' for h in csv_header])
-    html += header_str
-    
-    html += """];
+        # Add CSV headers
+        header_str = ", ".join([f'"{h}"' for h in csv_header])
+        write(header_str)
+        
+        write("""];
         csvRows.push(headers.join(","));
         
         var turnDivs = document.querySelectorAll(".turn");
@@ -329,155 +496,132 @@ document.addEventListener('DOMContentLoaded', function() {
             var turn = turnDiv.getAttribute("data-turn") || "";
             var sender = turnDiv.getAttribute("data-sender") || "";
             var row = [turn, sender];
-"""
+""")
 
-    # Generate JavaScript for processing each dropdown category
-    for i, config in enumerate(dropdown_configs):
-        cat_id = i + 1
-        is_dependent = isinstance(config['options'], dict)
-        html += f"""
-            // Process category {cat_id}: {config['name']}
-            (function() {{
-                var cat = {cat_id};
-                var isDependent = {str(is_dependent).lower()};
-                var catGroups = turnDiv.querySelectorAll('[data-cat="' + cat + '"]');
-                var primaryVals = [];
-                var detailedVals = [];
-                
-                catGroups.forEach(function(group) {{
-                    var primary = group.querySelector('select[data-dd="' + cat + '"]');
-                    if (primary && primary.value.trim() !== "") {{
-                        primaryVals.push(primary.value.trim());
-                        
-                        if (isDependent) {{
-                            var detail = "";
-                            var depSel = group.querySelector('.dropdown-group[data-dd="dep"] select');
-                            var otherInp = group.querySelector('.dropdown-group[data-dd="other"] input');
-                            
-                            if (otherInp && getComputedStyle(otherInp.parentElement).display !== "none" && otherInp.value.trim() !== "") {{
-                                detail = otherInp.value.trim();
-                            }} else if (depSel && getComputedStyle(depSel.parentElement).display !== "none" && depSel.value.trim() !== "") {{
-                                detail = depSel.value.trim();
-                            }}
-                            
-                            if (detail !== "") {{
-                                detailedVals.push(detail);
-                            }}
-                        }}
-                    }}
-                }});
-                
-                row.push(primaryVals.join(";"));
-                if (isDependent) {{
-                    row.push(detailedVals.join(";"));
-                }}
-            }})();
-"""
-    
-    html += """
+        # Generate JavaScript for processing each dropdown category
+        write("".join([
+            _CSV_CATEGORY_JS.format(cat_id=i + 1, name=config['name'], is_dep=str(is_dependent).lower())
+            for i, (config, is_dependent) in enumerate(zip(dropdown_configs, is_dependent_flags))
+        ]))
+        
+        write("""
             csvRows.push(row.join(","));
         });
         
-        var csvContent = "data:text/csv;charset=utf-8," + csvRows.join("\\n");
-        var encodedUri = encodeURI(csvContent);
+        // Hand the CSV to the browser as a Blob (no URI-encoding pass, no data-URI size limit)
+        var blob = new Blob([csvRows.join("\\n")], {type: "text/csv;charset=utf-8"});
+        var url = URL.createObjectURL(blob);
         var link = document.createElement("a");
-        link.setAttribute("href", encodedUri);
-        link.setAttribute("download", "group_chat_"""
+        link.setAttribute("href", url);
+        link.setAttribute("download", "group_chat_""")
 
-    # Create a safe filename
-    safe_chat_id = ''.join(c for c in chat_id if c.isalnum() or c in '_-')
-    html += f"{safe_chat_id}_coded.csv"
-    
-    html += """");
+        # Create a safe filename
+        write(f"{_safe_chat_id(chat_id)}_coded.csv")
+        
+        write("""");
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
+        // Revoke only after the browser has had a chance to start reading the blob
+        setTimeout(function() { URL.revokeObjectURL(url); }, 1000);
     });
 });
 </script>
-"""
+""")
 
-    # Build conversation turns with the dropdowns
-    for turn_idx, turn in enumerate(turns):
-        sender = turn[0].get('sender_alias', '')
-        
-        alignment = "right" if sender == main_user else "left"
-        html += f'<div class="turn {alignment}" data-turn="{turn_idx}" data-sender="{sender}">\n'
-        html += f'<strong>Turn {turn_idx + 1} ({sender}):</strong><br>\n'
-        for msg in turn:
-            timestamp = msg.get('timestamp', '')
-            message_text = msg.get('message', '')
-            message_translated = msg.get('message_translated', '')
-            
-            html += f'<div class="message"><span class="timestamp">{timestamp}</span> - <span class="text">{message_text}</span>'
-            
-            # Add translation if available and different from original
-            if message_translated and message_translated != message_text:
-                html += f'<br><span class="translation">[Translation: {message_translated}]</span>'
-            
-            html += '</div>\n'
-        html += '<div class="dropdown-container">\n'
-        
-        # Generate dropdowns based on configurations
+        # Controls shown under a dependent dropdown: the detailed dropdown and an input for "Other"
+        dependent_controls = (
+            '<div class="dropdown-group" data-dd="dep" style="display:none;">\n'
+            '<label>Detailed: </label>\n'
+            '<select class="dependent-dropdown" data-dd="dep">\n'
+            '<option value="">--Select--</option>\n'
+            '</select>\n'
+            '</div>\n'
+            '<div class="dropdown-group" data-dd="other" style="display:none;">\n'
+            '<label>Please specify: </label>\n'
+            '<input type="text" class="other-input" data-dd="other" />\n'
+            '</div>\n'
+        )
+
+        # The dropdowns only differ between turns in data-turn, so render them
+        # once as a format template (literal braces doubled) and fill that in per turn
+        dropdown_blocks = []
         for i, config in enumerate(dropdown_configs):
             cat_id = i + 1
-            is_dependent = isinstance(config['options'], dict)
+            is_dependent = is_dependent_flags[i]
             container_class = "category-group" if is_dependent else "dropdown-group-container"
-            
-            html += f'<div class="{container_class}" data-cat="{cat_id}" data-turn="{turn_idx}">\n'
-            
-            # Primary dropdown
-            html += f'<div class="dropdown-group" data-dd="{cat_id}">\n'
-            html += f'<label>{config["label"]}: </label>\n'
-            html += f'<select class="turn-dropdown" data-dd="{cat_id}">\n'
-            
             if is_dependent:
                 # For dependent dropdown, options are the keys of the dictionary
                 options_list = list(config['options'].keys())
                 options_list.append("Other")  # Add "Other" option
-                html += generate_options(options_list)
             else:
                 # For simple dropdown, options are directly from the list
-                html += generate_options(config['options'])
-            
-            html += '</select>\n'
-            html += '</div>\n'
+                options_list = config['options']
+            static_html = (
+                # Primary dropdown
+                f'<div class="dropdown-group" data-dd="{cat_id}">\n'
+                f'<label>{config["label"]}: </label>\n'
+                f'<select class="turn-dropdown" data-dd="{cat_id}">\n'
+                f'{generate_options(options_list)}'
+                '</select>\n'
+                '</div>\n'
+                f'{dependent_controls if is_dependent else ""}'
+                f'<button type="button" class="add-button" data-cat="{cat_id}">{config["button_text"]}</button>\n'
+                '</div>\n'
+            )
+            dropdown_blocks.append(
+                f'<div class="{container_class} cat-{cat_id}" data-cat="{cat_id}" data-turn="{{turn_idx}}">\n'
+                + static_html.replace('{', '{{').replace('}', '}}')
+            )
+        # Everything after a turn's messages is the same for every turn but data-turn:
+        # the dropdown container with all dropdowns, and the closing tags
+        turn_tail_template = (
+            '<div class="dropdown-container">\n'
+            + ''.join(dropdown_blocks)
+            + '</div>\n'  # End of dropdown-container
+            '</div>\n'  # End of turn div
+        )
+
+        # Build conversation turns with the dropdowns. Senders and message texts are
+        # escaped so markup in a message can't break (or inject into) the page.
+        escape = html.escape
+        for turn_idx, turn in enumerate(turns):
+            sender = turn[0].get('sender_alias', '')
             
-            # If dependent dropdown, add the dependent controls
-            if is_dependent:
-                # Dependent dropdown
-                html += f'<div class="dropdown-group" data-dd="dep" style="display:none;">\n'
-                html += f'<label>Detailed: </label>\n'
-                html += f'<select class="dependent-dropdown" data-dd="dep">\n'
-                html += '<option value="">--Select--</option>\n'
-                html += '</select>\n'
-                html += '</div>\n'
+            alignment = "right" if sender == main_user else "left"
+            sender_html = escape(str(sender))
+            # Collect the turn's pieces and write them in one call
+            turn_parts = [
+                f'<div class="turn {alignment}" data-turn="{turn_idx}" data-sender="{sender_html}">\n'
+                f'<strong>Turn {turn_idx + 1} ({sender_html}):</strong><br>\n'
+            ]
+            for msg in turn:
+                timestamp = msg.get('timestamp', '')
+                message_text = msg.get('message', '')
+                message_translated = msg.get('message_translated', '')
                 
-                # Input field for "Other"
-                html += f'<div class="dropdown-group" data-dd="other" style="display:none;">\n'
-                html += f'<label>Please specify: </label>\n'
-                html += f'<input type="text" class="other-input" data-dd="other" />\n'
-                html += '</div>\n'
+                # Add translation if available and different from original
+                translation_html = ''
+                if message_translated and message_translated != message_text:
+                    translation_html = f'<br><span class="translation">[Translation: {escape(str(message_translated), quote=False)}]</span>'
+                
+                turn_parts.append(f'<div class="message"><span class="timestamp">{timestamp}</span> - <span class="text">{escape(str(message_text), quote=False)}</span>{translation_html}</div>\n')
             
-            html += f'<button type="button" class="add-button" data-cat="{cat_id}">{config["button_text"]}</button>\n'
-            html += '</div>\n'
-        
-        html += '</div>\n'  # End of dropdown-container
-        html += '</div>\n'  # End of turn div
+            # Dropdowns and closing tags for this turn (prepared once above)
+            turn_parts.append(turn_tail_template.format(turn_idx=turn_idx))
+            write(''.join(turn_parts))
 
-    html += '<div class="clear"></div>\n'
-    # Download CSV button
-    html += '<button class="download-button" id="downloadCSVButton">Download</button>\n'
-    
-    # Close tags
-    html += """
+        write('<div class="clear"></div>\n')
+        # Download CSV button
+        write('<button class="download-button" id="downloadCSVButton">Download</button>\n')
+        
+        # Close tags
+        write("""
 </div>
 </body>
 </html>
-"""
+""")
     
-    with open(html_file, "w", encoding="utf-8") as f:
-        f.write(html)
     print(f"HTML file '{html_file}' created successfully.")
 
 
@@ -503,12 +647,13 @@ def process_group_chat(
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Parse the group chat file
-    messages = parse_group_chat(file_path)
-    print(f"Parsed {len(messages)} messages from {file_path}")
+    # Parse the group chat file, keeping only the requested chat. Its senders are counted
+    # in the same pass, and the result serves the main user lookup and the HTML generation.
+    chat_messages, sender_counts = _parse_chat(file_path, chat_id)
+    print(f"Parsed {len(chat_messages)} messages for chat_id {chat_id} from {file_path}")
     
-    if not messages:
-        print("No messages found in file.")
+    if not chat_messages:
+        print(f"No messages found for chat_id: {chat_id}")
         return
     
     # Use default configurations if none provided
@@ -517,22 +662,19 @@ def process_group_chat(
     
     # If main_user is not specified, use the most active user in the chat
     if not main_user:
-        main_user = find_most_active_user(messages, chat_id)
+        main_user = _most_active(sender_counts)
         if main_user:
             print(f"Using '{main_user}' as the main user (messages shown on right)")
         else:
             print("Could not determine a main user.")
             # If no main user found, use the first sender in the filtered messages
-            chat_messages = [msg for msg in messages if msg.get('chat_id') == chat_id]
             if chat_messages:
                 main_user = chat_messages[0].get('sender_alias', '')
                 print(f"Using first sender '{main_user}' as the main user")
-        chat_messages = [msg for msg in messages if msg.get('chat_id') == chat_id]
         print(f"Filtered {len(chat_messages)} messages for chat_id: {chat_id}")
     # Generate HTML file
-    safe_chat_id = ''.join(c for c in chat_id if c.isalnum() or c in '_-')
-    html_file = os.path.join(output_dir, f'group_chat_{safe_chat_id}.html')
-    group_chat_to_html(messages, chat_id, main_user, html_file, dropdown_configs)
+    html_file = os.path.join(output_dir, f'group_chat_{_safe_chat_id(chat_id)}.html')
+    _write_group_chat_html(chat_messages, sender_counts, chat_id, main_user, html_file, dropdown_configs)
 
 
 def get_sample_configs():
@@ -573,7 +715,6 @@ def get_sample_configs():
 # Main execution
 if __name__ == "__main__":
     import argparse
-    import sys
     
     # Terminal execution
     parser = argparse.ArgumentParser(description='Process group chat log files and generate HTML conversation views')